@@ -1,16 +1,22 @@
-import json
+import contextlib
+import hashlib
 import os
+import time
 from typing import Any
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import orjson
+import psycopg
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg.types.string import TextLoader
+from psycopg_pool import AsyncConnectionPool
 import uvicorn
 import argparse
-import datetime
-import decimal
+from pydantic import AnyUrl
 
+from mcp.server import Server
 from mcp.server.fastmcp import FastMCP
 from mcp.server.sse import SseServerTransport
+import mcp.types as types
 
 from starlette.applications import Starlette
 from starlette.requests import Request
@@ -21,117 +27,337 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastMCP server for postgres tools (SSE)
-mcp = FastMCP("postgres")
+# Hand json/jsonb values back as the raw text Postgres sent: they are only
+# forwarded to the client, so parsing them with json.loads is wasted work
+psycopg.adapters.register_loader("json", TextLoader)
+psycopg.adapters.register_loader("jsonb", TextLoader)
 
 # --- Constants and Global Variables ---
 SCHEMA_RESOURCE = "schema://main"
 DATABASE_URL = None  # Will be set later from command-line argument or .env
-
-
-def execute_query(query, params=None):
-    # Connect using a single connection string (DSN)
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            # If it's a SELECT query, fetch and return results.
-            if query.strip().upper().startswith("SELECT"):
-                results = cur.fetchall()
+POOL = None  # Process-wide async connection pool, opened in the app lifespan
+DEBUG = os.getenv("DEBUG") == "1"  # Pretty-print the schema://main listing when set
+
+# Compact output by default; indentation only helps a human reading responses
+JSON_OPTIONS = orjson.OPT_INDENT_2 if DEBUG else 0
+
+# Catalog lookups rarely change between requests, so keep them in memory
+# for SCHEMA_CACHE_TTL seconds (or until the refresh_schema tool is called).
+SCHEMA_CACHE_TTL = 60
+SCHEMA_CACHE: dict[str, tuple[float, Any]] = {}
+
+# Column list of every public table, grouped per table and encoded as JSON
+# text by Postgres. array_to_json over row values is compact, whereas
+# json_agg/json_build_object add whitespace between elements and around ":".
+SCHEMA_SQL = (
+    "SELECT table_name, array_to_json(array_agg("
+    "(SELECT c FROM (SELECT column_name, data_type) c) "
+    "ORDER BY ordinal_position))::text "
+    "FROM information_schema.columns WHERE table_schema='public' "
+    "GROUP BY table_name ORDER BY table_name"
+)
+
+# Wraps the query tool's SQL so the result comes back as a single compact
+# JSON array of at most {limit} rows, plus whether more rows were available
+# (one extra row is fetched to tell). {sql} sits on its own line so a
+# trailing "--" comment can't swallow the closing parenthesis.
+QUERY_JSON_SQL = (
+    "SELECT coalesce(array_to_json((array_agg(t))[1:{limit}])::text, '[]'), "
+    "count(*) > {limit} "
+    "FROM (SELECT * FROM (\n{sql}\n) _q LIMIT {limit} + 1) t"
+)
+
+# Resource guards for the query tool, applied inside its read-only transaction
+QUERY_STATEMENT_TIMEOUT = "5s"
+QUERY_WORK_MEM = "64MB"
+QUERY_ROW_LIMIT = 10000
+# Reject queries whose planner estimate exceeds this cost; unset (or 0) skips
+# the extra EXPLAIN round-trip
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "0")) or None
+
+QUERY_TOOL_DESCRIPTION = (
+    "Run a read-only SQL query. Only SELECT (or WITH ... SELECT) statements "
+    "are accepted, since the result is wrapped to be returned as JSON. "
+    f"At most {QUERY_ROW_LIMIT} rows are returned; a second text item "
+    "reports when the result was truncated"
+)
+QUERY_TRUNCATED_NOTE = (
+    f"Result truncated to the first {QUERY_ROW_LIMIT} rows; "
+    "add a LIMIT or a narrower filter to see the rest"
+)
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+async def execute_query(query, params=None, prepare=None):
+    # Borrow a warm connection from the pool instead of connecting per call
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            # prepare=True keeps a server-side prepared statement on the pooled
+            # connection, so repeated runs skip parsing and planning
+            await cur.execute(query, params, prepare=prepare)
+            # If the statement produced a result set (SELECT, WITH, RETURNING,
+            # SHOW, EXPLAIN...), fetch and return results.
+            if cur.description is not None:
+                results = await cur.fetchall()
                 return results
-            # For non-SELECT queries, commit changes.
-            conn.commit()
-    finally:
-        conn.close()
-
-
-# --- Resource Handlers ---
-@mcp.resource(SCHEMA_RESOURCE)
-async def get_schema() -> str:
-    
-    rows = execute_query(
-        "SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_schema='public'"
-    )
-
-    # Convert each row (a tuple) into a dictionary.
-    schema_data = [
-        {"table_name": row[0], "column_name": row[1], "data_type": row[2]}
-        for row in rows
-    ]
-
-    # Build the resources list using the converted schema_data.
-    resources = [
+            # Otherwise commit changes.
+            await conn.commit()
+
+
+def strip_trailing_semicolon(sql):
+    # A terminating ";" is not allowed inside the query wrapper's subquery.
+    # Walk back from the end, dropping whitespace, whole "--" comment lines,
+    # and a ";" optionally followed by a "--" comment on its line. Text with
+    # quotes is left alone so a ";" or "--" inside a string literal is never
+    # mistaken for the terminator. Each step consumes input, so this is linear.
+    end = len(sql.rstrip())
+    while end:
+        start = sql.rfind("\n", 0, end) + 1
+        line = sql[start:end]
+        semi = line.rfind(";")
+        rest = line[semi + 1:].strip()
+        if "'" in rest or '"' in rest:
+            break
+        if line.lstrip().startswith("--") and semi < 0:
+            end = start
+        elif semi >= 0 and (not rest or rest.startswith("--")):
+            end = start + semi
+        else:
+            break
+        while end and sql[end - 1].isspace():
+            end -= 1
+    return sql[:end].lstrip()
+
+
+def pool_conninfo(dsn, socket_dir=None):
+    # Tune the DSN for the pool: talk to a local server over its Unix socket
+    # (no TCP/TLS handshake) when a socket directory is given, otherwise keep
+    # TCP but probe idle pooled connections with keepalives
+    params = conninfo_to_dict(dsn)
+    if socket_dir and params.get("host", "localhost") in LOCAL_HOSTS:
+        params["host"] = socket_dir
+        params.pop("hostaddr", None)
+    elif not params.get("host", "").startswith("/"):
+        params.setdefault("keepalives_idle", 30)
+    return make_conninfo(**params)
+
+
+async def get_cached(key, loader, ttl=SCHEMA_CACHE_TTL):
+    # Serve from SCHEMA_CACHE while the entry is fresh, otherwise reload it
+    now = time.monotonic()
+    entry = SCHEMA_CACHE.get(key)
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+    value = await loader()
+    SCHEMA_CACHE[key] = (now, value)
+    return value
+
+
+async def _load_schema():
+    # One catalog scan feeds every schema handler. The resource listings are
+    # built here too, once per load, so the list handlers only return cached
+    # objects instead of re-validating URIs and re-encoding JSON per call.
+    rows = await execute_query(SCHEMA_SQL, prepare=True)
+    tables = dict(rows)  # {table: columns JSON text}
+
+    listing = [
         {
-            "uri": f"table-schema://{item['table_name']}",
+            "uri": f"table-schema://{table}",
             "mimeType": "application/json",
-            "name": f"\"{item['table_name']}\" database schema",
+            "name": f"\"{table}\" database schema",
         }
-        for item in schema_data
-    ]
-
-    return json.dumps({ "resources" : resources}, indent=2)
-
-
-
-@mcp.resource("table-schema://{table}")
-async def get_table_schema(table: str) -> str:
-    
-    rows = execute_query(
-        f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table}'"
-    )
-
-    # Manually create dictionaries from each row
-    schema_data = [
-        {"column_name": row[0], "data_type": row[0]}
-        for row in rows
+        for table in tables
     ]
-
-    return json.dumps({
-            "uri": "table-schema://{table}",
-            "mimeType": "application/json",
-            "text": json.dumps(schema_data, indent=2)
-            }, indent=2)
-
-
-
-class CustomEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (datetime.date, datetime.datetime)):
-            return obj.isoformat()
-        if isinstance(obj, decimal.Decimal):
-            return float(obj)
-        return super(CustomEncoder, self).default(obj)
-    
-
-# readonly query support
-def fetch_query(sql):
-    # Connect using a single connection string (DSN)
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        # Start a transaction block
-        with conn:
-            # Use a RealDictCursor to fetch rows as dictionaries
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SET TRANSACTION READ ONLY")
-                cur.execute(sql)
-                rows = cur.fetchall()
-                return rows
-    finally:
-        conn.close()
-
-
-# --- Register the "query" tool using the mcp.tool() decorator with positional arguments ---
-@mcp.tool("query", "Run a read-only SQL query")
-async def query_tool(sql: str) -> str:
-    rows = fetch_query(sql)
-    return json.dumps([dict(row) for row in rows], indent=2, cls=CustomEncoder)
+    # Content hash of the listing (SCHEMA_SQL orders tables by name, so it is
+    # stable across reloads), letting clients tell whether it changed
+    etag = hashlib.sha256(orjson.dumps(listing)).hexdigest()
+
+    return {
+        "tables": tables,
+        "resources": [
+            types.Resource(
+                uri=AnyUrl(f"table-schema://{table}"),
+                mimeType="application/json",
+                name=f'"{table}" database schema',
+                description=f"Schema details for table '{table}'",
+            )
+            for table in tables
+        ],
+        # orjson encodes in C; kept as str so FastMCP serves a text (not blob) body
+        "resources_json": orjson.dumps(
+            {"etag": etag, "resources": listing}, option=JSON_OPTIONS
+        ).decode(),
+    }
+
+
+# readonly query support; returns (JSON text, whether rows were cut off)
+async def fetch_query(sql):
+    # The pooled connection block is a transaction: committed (or rolled
+    # back on error) when the connection goes back to the pool
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SET TRANSACTION READ ONLY")
+            # Transaction-local limits, so the pooled connection is unaffected
+            await cur.execute(
+                "SELECT set_config('statement_timeout', %s, true), "
+                "set_config('work_mem', %s, true)",
+                (QUERY_STATEMENT_TIMEOUT, QUERY_WORK_MEM),
+            )
+            sql = strip_trailing_semicolon(sql)
+            if QUERY_MAX_COST is not None:
+                await cur.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = orjson.loads((await cur.fetchone())[0])
+                cost = plan[0]["Plan"]["Total Cost"]
+                if cost > QUERY_MAX_COST:
+                    raise ValueError(
+                        f"Query rejected: estimated cost {cost:.0f} exceeds {QUERY_MAX_COST:.0f}"
+                    )
+            # Let Postgres encode the whole result as one JSON text value
+            # instead of decoding every column in Python and re-serializing
+            await cur.execute(QUERY_JSON_SQL.format(sql=sql, limit=QUERY_ROW_LIMIT))
+            text, truncated = await cur.fetchone()
+            return text, truncated
+
+
+# --- Server Flavors ---
+# Both flavors share the database layer above and expose the same tools
+# (query, refresh_schema). Resources differ: FastMCP serves schema://main plus
+# the table-schema://{table} template, while the base Server lists one
+# table-schema:// resource per table. Only the chosen flavor is constructed
+# and has its handlers registered.
+
+def build_fastmcp_server() -> Server:
+    """Build the server on FastMCP's decorator API."""
+    mcp = FastMCP("postgres")
+
+    @mcp.resource(SCHEMA_RESOURCE)
+    async def get_schema() -> str:
+
+        # Listing pre-serialized when the schema was loaded
+        return (await get_cached("schema", _load_schema))["resources_json"]
+
+    @mcp.resource("table-schema://{table}")
+    async def get_table_schema(table: str) -> str:
+
+        tables = (await get_cached("schema", _load_schema))["tables"]
+
+        # Already-serialized JSON array of the table's columns
+        return tables.get(table, "[]")
+
+    # --- Register the "query" tool using the mcp.tool() decorator with positional arguments ---
+    @mcp.tool("query", QUERY_TOOL_DESCRIPTION)
+    async def query_tool(sql: str) -> list[str]:
+        text, truncated = await fetch_query(sql)
+        return [text, QUERY_TRUNCATED_NOTE] if truncated else [text]
+
+    @mcp.tool("refresh_schema", "Drop cached schema metadata so the next lookup reloads it")
+    async def refresh_schema_tool() -> str:
+        SCHEMA_CACHE.clear()
+        return "Schema cache cleared"
+
+    return mcp._mcp_server  # noqa: WPS437
+
+
+def build_base_server() -> Server:
+    """Build the server on the low-level MCP Server API."""
+    mcp = Server("postgres")
+
+    @mcp.list_resources()
+    async def list_schema_resources() -> list[types.Resource]:
+        """
+        List available database schema resources.
+        Each resource corresponds to a distinct table in the public schema.
+        """
+        # Resource objects are built once per schema load and reused.
+        return (await get_cached("schema", _load_schema))["resources"]
+
+    # read resource handler
+    @mcp.read_resource()
+    async def handle_read_resource(uri: AnyUrl) -> str:
+        print(f"Handling read_resource request for URI: {uri}")
+
+        if uri.scheme != "table-schema":
+            print(f"Unsupported URI scheme: {uri.scheme}")
+            return f"Unsupported URI scheme: {uri.scheme}"
+
+        table = str(uri).replace("table-schema://", "")
+
+        tables = (await get_cached("schema", _load_schema))["tables"]
+
+        # Already-serialized JSON array of the table's columns
+        return tables.get(table, "[]")
+
+    @mcp.call_tool()
+    async def handle_call_tool(
+        name: str, arguments: dict[str, Any] | None
+    ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+        try:
+
+            #print(f"Handling call_tool request for tool: {name} with arguments: {arguments}")
+            if name == "query":
+
+                text, truncated = await fetch_query(arguments["sql"])
+
+                content = [types.TextContent(type="text", text=text)]
+                if truncated:
+                    content.append(types.TextContent(type="text", text=QUERY_TRUNCATED_NOTE))
+                return content
+            elif name == "refresh_schema":
+
+                SCHEMA_CACHE.clear()
+
+                return [types.TextContent(type="text", text="Schema cache cleared")]
+            else:
+                return [types.TextContent(type="text", text=f"Unknown tool: {name}")]
+
+        # Only database and bad-input errors become a text reply; anything else
+        # (including cancellation) propagates to the MCP server's own handling
+        except (psycopg.Error, ValueError) as e:
+            return [types.TextContent(type="text", text=f"Error: {e}")]
+
+    # list tools endpoint
+    @mcp.list_tools()
+    async def handle_list_tools() -> list[types.Tool]:
+        return [
+            types.Tool(
+                name="query",
+                description=QUERY_TOOL_DESCRIPTION,
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "sql": {"type": "string"}
+                    },
+                    "required": ["sql"],
+                },
+            ),
+            types.Tool(
+                name="refresh_schema",
+                description="Drop cached schema metadata so the next lookup reloads it",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                },
+            ),
+        ]
+
+    return mcp
+
+
+FLAVORS = {
+    "fastmcp": build_fastmcp_server,
+    "base": build_base_server,
+}
 
 
 # --- Starlette App and SSE Transport ---
 
-def create_starlette_app(mcp_server: FastMCP, *, debug: bool = False) -> Starlette:
+def create_starlette_app(mcp_server: Server, *, debug: bool = False) -> Starlette:
     """Create a Starlette application to serve the MCP server over SSE."""
     sse = SseServerTransport("/messages/")
+    # Handlers are registered once, so the options are the same for every
+    # SSE connection; build them here instead of on each connect
+    init_options = mcp_server.create_initialization_options()
 
     async def handle_sse(request: Request) -> None:
         async with sse.connect_sse(
@@ -142,11 +368,20 @@ def create_starlette_app(mcp_server: FastMCP, *, debug: bool = False) -> Starlet
             await mcp_server.run(
                 read_stream,
                 write_stream,
-                mcp_server.create_initialization_options(),
+                init_options,
             )
 
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        await POOL.open()
+        try:
+            yield
+        finally:
+            await POOL.close()
+
     return Starlette(
         debug=debug,
+        lifespan=lifespan,
         routes=[
             Route("/sse", endpoint=handle_sse),
             Mount("/messages/", app=sse.handle_post_message),
@@ -157,17 +392,21 @@ def create_starlette_app(mcp_server: FastMCP, *, debug: bool = False) -> Starlet
 
 if __name__ == "__main__":
 
-    mcp_server = mcp._mcp_server  # noqa: WPS437
-
     # Use .env variable PORT if available; default to 8080
     DEFAULT_PORT = int(os.getenv("PORT", "8080"))
     DEFAULT_DATABASE_URL = os.getenv("DATABASE_URL")
+    DEFAULT_SOCKET_DIR = os.getenv("DATABASE_SOCKET_DIR")
 
     parser = argparse.ArgumentParser(description="Run MCP SSE-based Postgres server")
+    parser.add_argument("--flavor", choices=sorted(FLAVORS), default="fastmcp",
+                        help="MCP server implementation: FastMCP or the low-level base Server")
     parser.add_argument("--host", default="0.0.0.0", help="Host to bind to")
     parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
     parser.add_argument("--database", type=str, default=DEFAULT_DATABASE_URL,
                         help="Database URL (or set DATABASE_URL in .env)")
+    parser.add_argument("--socket-dir", type=str, default=DEFAULT_SOCKET_DIR,
+                        help="Unix socket directory used instead of TCP for a localhost database, "
+                             "e.g. /var/run/postgresql (or set DATABASE_SOCKET_DIR in .env)")
     args = parser.parse_args()
 
     if not args.database:
@@ -175,7 +414,10 @@ if __name__ == "__main__":
         exit(1)
 
     DATABASE_URL = args.database
+    POOL = AsyncConnectionPool(pool_conninfo(DATABASE_URL, args.socket_dir),
+                               min_size=2, max_size=32, open=False)
 
+    mcp_server = FLAVORS[args.flavor]()
     starlette_app = create_starlette_app(mcp_server, debug=True)
 
     try: